@@ -1,8 +1,9 @@
 import asyncio
 import datetime
-import random
+import os.path
 import sys
 import uuid
+import zlib
 
 import discord
 import discord.utils
@@ -12,10 +13,12 @@ from lightsteem.client import Client as LightsteemClient
 from lightsteem.datastructures import Operation
 from pymongo import MongoClient
 
+from . import snapshot
+from .curation import CurationMixin
 from .embeds import get_vote_details
 
 
-class DcomClient(commands.Bot):
+class DcomClient(CurationMixin, commands.Bot):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -39,6 +42,21 @@ class DcomClient(commands.Bot):
         self.bot_account = self.config.get("bot_account")
         self.auto_curation_vote_weight = 20
 
+        # transfers older than that (seconds) are not checked
+        self.transfers_window = 3600
+
+        # runtime state, persisted into the snapshot file.
+        self.processed_memos = {}
+        self.curated_authors = {}
+        self.curated_authors_synced_at = None
+        self.verified_patrons = None
+        self.verified_patrons_fetched_at = None
+        self.snapshot_path = self.config.get("snapshot_path")
+        self.snapshot_interval = 60
+        self.snapshot_max_age = 3600
+        if self.snapshot_path:
+            self.load_snapshot()
+
     @asyncio.coroutine
     def on_ready(self):
         print(self.user.name)
@@ -65,6 +83,7 @@ class DcomClient(commands.Bot):
             )
             self.mongo_database["patrons"].delete_many(
                 {"discord_id": str(after)})
+            self.verified_patrons = None
         elif self.patron_role in after_roles and \
                 self.patron_role not in before_roles:
             # we have a new patron
@@ -75,6 +94,7 @@ class DcomClient(commands.Bot):
             self.mongo_database["patrons"].insert(
                 {"discord_id": str(after)}
             )
+            self.verified_patrons = None
 
     def say_error(self, error):
         return self.say(f"**Error:** {error}")
@@ -145,79 +165,108 @@ class DcomClient(commands.Bot):
 
         return verification_code
 
-    def get_a_random_patron_post(self):
+    def get_verified_patrons(self):
+        # The list is cached for a curation interval, or until a patron
+        # or a verification changes.
+        if self.verified_patrons is not None and \
+                (self.utcnow() - self.verified_patrons_fetched_at). \
+                total_seconds() < self.auto_curation_interval:
+            return self.verified_patrons
 
         # Get a list of verified discord members having the role "patron:
         patron_users = list(self.mongo_database["patrons"].find())
         patron_users_ids = [u["discord_id"] for u in patron_users]
-        verified_patrons = list(self.mongo_database["verification_codes"] \
-                                .find({
-            "verified": True,
-            "discord_id": {"$in": patron_users_ids}}
-        ).distinct("steem_username"))
-
-        # Remove the patrons already voted in the last 24h.
-        curated_authors = self.get_curated_authors_in_last_24_hours()
-        verified_patrons = set(verified_patrons) - curated_authors
-
-        print("Patrons", verified_patrons)
-        # Prepare a list of patron posts
-        posts = []
-        for patron in verified_patrons:
-            posts.append(self.get_last_votable_post(patron))
-
-        if len(posts):
-            # We have found some posts, shuffle it and
-            # return the first element.
-            random.shuffle(posts)
-            return posts[0]
-
-    def get_curated_authors_in_last_24_hours(self):
-        """
-        Returns a set of authors curated
-        by the self.bot_account.
-        """
-        account = self.lightsteem_client.account(self.bot_account)
-        one_day_ago = datetime.datetime.utcnow() - \
-                      datetime.timedelta(days=1)
-        voted_authors = set()
-        for op in account.history(filter=["vote"], stop_at=one_day_ago):
-            if op["voter"] != self.bot_account:
-                continue
-
-            voted_authors.add(op["author"])
+        self.verified_patrons = list(
+            self.mongo_database["verification_codes"].find({
+                "verified": True,
+                "discord_id": {"$in": patron_users_ids}}
+            ).distinct("steem_username"))
+        self.verified_patrons_fetched_at = self.utcnow()
 
-        return voted_authors
+        return self.verified_patrons
 
-    def get_last_votable_post(self, patron):
+    def prune_processed_memos(self):
         """
-        Returns a list of [author, permlink] lists.
-        Output of this function is designed to be used in automatic curation.
+        Forgets the memos processed before the transfers window, they
+        can't show up in the checked history anymore.
         """
-        posts = self.lightsteem_client.get_discussions_by_blog(
-            {"limit": 7, "tag": patron})
-        for post in posts:
+        window_start = self.utcnow() - datetime.timedelta(
+            seconds=self.transfers_window)
+        self.processed_memos = {
+            memo: processed_at
+            for memo, processed_at in self.processed_memos.items()
+            if processed_at >= window_start
+        }
+
+    def save_snapshot(self):
+        """
+        Writes the runtime state into the snapshot file.
+        """
+        self.prune_processed_memos()
+        snapshot.dump(self.snapshot_path, {
+            "created_at": self.utcnow().isoformat(),
+            "processed_memos": {
+                memo: processed_at.isoformat()
+                for memo, processed_at in self.processed_memos.items()
+            },
+            "curated_authors": {
+                author: voted_at.isoformat()
+                for author, voted_at in self.curated_authors.items()
+            },
+            "curated_authors_synced_at":
+                self.curated_authors_synced_at.isoformat()
+                if self.curated_authors_synced_at else None,
+            "verified_patrons": self.verified_patrons,
+            "verified_patrons_fetched_at":
+                self.verified_patrons_fetched_at.isoformat()
+                if self.verified_patrons_fetched_at else None,
+        })
 
-            # exclude reblogs
-            if post["author"] != patron:
-                continue
+    def load_snapshot(self):
+        """
+        Restores the runtime state from the snapshot file, if it's valid
+        and fresh enough.
+        """
+        if not os.path.exists(self.snapshot_path):
+            return
 
-            # check if it's votable
-            created = parse(post["created"])
-            diff_in_seconds = (datetime.datetime.utcnow() - created). \
+        # a bad snapshot must not block the startup, fall back to
+        # a cold start.
+        try:
+            state = snapshot.load(self.snapshot_path)
+            age = (self.utcnow() - parse(state["created_at"])). \
                 total_seconds()
+            if age > self.snapshot_max_age:
+                print(f"Ignoring the snapshot. It's {int(age)} seconds old.")
+                return
+
+            processed_memos = {
+                memo: parse(processed_at)
+                for memo, processed_at in state["processed_memos"].items()
+            }
+            curated_authors = {
+                author: parse(voted_at)
+                for author, voted_at in state["curated_authors"].items()
+            }
+            curated_authors_synced_at = None
+            if state["curated_authors_synced_at"]:
+                curated_authors_synced_at = parse(
+                    state["curated_authors_synced_at"])
+            verified_patrons = state["verified_patrons"]
+            verified_patrons_fetched_at = None
+            if state["verified_patrons_fetched_at"]:
+                verified_patrons_fetched_at = parse(
+                    state["verified_patrons_fetched_at"])
+        except (OSError, ValueError, KeyError, zlib.error) as e:
+            print(f"Ignoring the snapshot. {e!r}")
+            return
 
-            # check if the post's age is lower than 6.5 days
-            if diff_in_seconds > 561600:
-                break
-
-            # check if we already voted on that.
-            voters = [v["voter"] for v in post["active_votes"]]
-            if self.account_for_vp_check in voters or \
-                    self.bot_account in voters:
-                continue
-
-            return post["author"], post["permlink"]
+        self.processed_memos = processed_memos
+        self.curated_authors = curated_authors
+        self.curated_authors_synced_at = curated_authors_synced_at
+        self.verified_patrons = verified_patrons
+        self.verified_patrons_fetched_at = verified_patrons_fetched_at
+        print(f"Restored the runtime state from {self.snapshot_path}.")
 
     @property
     def running_on(self):
@@ -259,19 +308,20 @@ class DcomClient(commands.Bot):
             {"code": memo},
             {'$set': {"verified": True}}
         )
+        self.verified_patrons = None
 
         # refund the user
         self.refund(verification_code["steem_username"], amount)
 
     async def check_transfers(self):
-        processed_memos = set()
         await self.wait_until_ready()
         while not self.is_closed:
             print("[task start] check_transfers()")
+            self.prune_processed_memos()
             # If there are no waiting verifications
             # There is no need to poll the account history
             one_hour_ago = datetime.datetime.utcnow() - \
-                           datetime.timedelta(minutes=60)
+                           datetime.timedelta(seconds=self.transfers_window)
             waiting_verifications = self.mongo_database["verification_codes"]. \
                 count({"last_update": {
                 "$gte": one_hour_ago}, "verified": False})
@@ -287,7 +337,7 @@ class DcomClient(commands.Bot):
                     for op in account.history(
                             stop_at=one_hour_ago,
                             filter=["transfer"]):
-                        if op.get("memo") in processed_memos:
+                        if op.get("memo") in self.processed_memos:
                             continue
                         if op.get("from") == self.registration_account:
                             continue
@@ -297,7 +347,7 @@ class DcomClient(commands.Bot):
                             op.get("amount"),
                             op.get("from")
                         )
-                        processed_memos.add(op.get("memo"))
+                        self.processed_memos[op.get("memo")] = self.utcnow()
 
                 except Exception as e:
                     print(e)
@@ -311,41 +361,39 @@ class DcomClient(commands.Bot):
         while not self.is_closed:
             try:
                 print("[task start] auto_curation()")
-                # vp must be eligible for automatic curation
-                acc = self.lightsteem_client.account(self.account_for_vp_check)
-                if acc.vp() >= int(self.limit_on_maximum_vp):
-
-                    # get the list of registered patrons
-                    post = self.get_a_random_patron_post()
-                    if post:
-                        author, permlink = post
-                        self.upvote(
-                            None,
+                vp, post = self.auto_curation_round()
+                if post:
+                    author, permlink = post
+                    await self.send_message(
+                        channel,
+                        f"**[auto-curation round]**",
+                        embed=get_vote_details(
+                            author, permlink,
                             self.auto_curation_vote_weight,
-                            author=author,
-                            permlink=permlink
-                        )
-                        await self.send_message(
-                            channel,
-                            f"**[auto-curation round]**",
-                            embed=get_vote_details(
-                                author, permlink,
-                                self.auto_curation_vote_weight,
-                                self.bot_account)
-                        )
-                    else:
-                        await self.send_message(
-                            channel,
-                            f"**[auto-curation round]** Couldn't find any "
-                            f"suitable post. Skipping."
-                        )
+                            self.bot_account)
+                    )
+                elif vp >= float(self.limit_on_maximum_vp):
+                    await self.send_message(
+                        channel,
+                        f"**[auto-curation round]** Couldn't find any "
+                        f"suitable post. Skipping."
+                    )
                 else:
                     await self.send_message(
                         channel,
                         f"**[auto-curation round]** Vp is not enough."
-                        f" ({acc.vp()}) Skipping."
+                        f" ({vp}) Skipping."
                     )
                 print("[task finish] auto_curation()")
             except Exception as e:
                 print(e)
-            await asyncio.sleep(900)
+            await asyncio.sleep(self.auto_curation_interval)
+
+    async def save_snapshots(self):
+        await self.wait_until_ready()
+        while not self.is_closed:
+            try:
+                self.save_snapshot()
+            except Exception as e:
+                print(e)
+            await asyncio.sleep(self.snapshot_interval)
@@ -0,0 +1,146 @@
+import datetime
+import random
+
+from dateutil.parser import parse
+
+
+class CurationMixin:
+    """
+    Decision logic of the automatic curation.
+
+    Depends on the lightsteem_client, bot_account, account_for_vp_check,
+    limit_on_maximum_vp, auto_curation_vote_weight, curated_authors and
+    curated_authors_synced_at attributes and the upvote() and
+    get_verified_patrons() methods of the host class. Kept free of Discord
+    and Mongo specifics, so the replay mode can run the same logic offline.
+    """
+
+    # seconds between two auto-curation rounds
+    auto_curation_interval = 900
+
+    # posts older than that (seconds) are not considered for curation
+    late_curation_window = 561600
+
+    # posts younger than that (seconds) are not considered for curation
+    early_curation_window = 0
+
+    # account history is re-scanned with that margin (seconds) to catch
+    # the ops indexed late by the nodes.
+    history_sync_margin = 300
+
+    def utcnow(self):
+        return datetime.datetime.utcnow()
+
+    def get_a_random_patron_post(self):
+
+        verified_patrons = self.get_verified_patrons()
+
+        # Remove the patrons already voted in the last 24h.
+        curated_authors = self.get_curated_authors_in_last_24_hours()
+        verified_patrons = set(verified_patrons) - curated_authors
+
+        print("Patrons", verified_patrons)
+        # Prepare a list of patron posts
+        posts = []
+        for patron in verified_patrons:
+            posts.append(self.get_last_votable_post(patron))
+
+        if len(posts):
+            # We have found some posts, shuffle it and
+            # return the first element.
+            random.shuffle(posts)
+            return posts[0]
+
+    def get_curated_authors_in_last_24_hours(self):
+        """
+        Returns a set of authors curated
+        by the self.bot_account.
+
+        Authors are kept in self.curated_authors with their last vote time,
+        so only the history after the last sync is fetched.
+        """
+        account = self.lightsteem_client.account(self.bot_account)
+        now = self.utcnow()
+        one_day_ago = now - datetime.timedelta(days=1)
+        stop_at = one_day_ago
+        if self.curated_authors_synced_at:
+            stop_at = max(stop_at, self.curated_authors_synced_at -
+                          datetime.timedelta(seconds=self.history_sync_margin))
+
+        for op in account.history(filter=["vote"], stop_at=stop_at):
+            if op["voter"] != self.bot_account:
+                continue
+
+            voted_at = op["timestamp"]
+            if isinstance(voted_at, str):
+                voted_at = parse(voted_at)
+            last_vote = self.curated_authors.get(op["author"])
+            if not last_vote or voted_at > last_vote:
+                self.curated_authors[op["author"]] = voted_at
+
+        # forget the authors fell out of the window
+        self.curated_authors = {
+            author: voted_at
+            for author, voted_at in self.curated_authors.items()
+            if voted_at >= one_day_ago
+        }
+        self.curated_authors_synced_at = now
+
+        return set(self.curated_authors)
+
+    def get_last_votable_post(self, patron):
+        """
+        Returns a list of [author, permlink] lists.
+        Output of this function is designed to be used in automatic curation.
+        """
+        posts = self.lightsteem_client.get_discussions_by_blog(
+            {"limit": 7, "tag": patron})
+        for post in posts:
+
+            # exclude reblogs
+            if post["author"] != patron:
+                continue
+
+            # check if it's votable
+            created = parse(post["created"])
+            diff_in_seconds = (self.utcnow() - created).total_seconds()
+
+            # check if the post is in the curation window
+            if diff_in_seconds > self.late_curation_window:
+                break
+
+            if diff_in_seconds < self.early_curation_window:
+                continue
+
+            # check if we already voted on that.
+            voters = [v["voter"] for v in post["active_votes"]]
+            if self.account_for_vp_check in voters or \
+                    self.bot_account in voters:
+                continue
+
+            return post["author"], post["permlink"]
+
+    def auto_curation_round(self):
+        """
+        Runs a single auto-curation round.
+        Returns a tuple of (vp, post). post is an (author, permlink) tuple
+        if a vote is casted in this round, None otherwise.
+        """
+        # vp must be eligible for automatic curation
+        acc = self.lightsteem_client.account(self.account_for_vp_check)
+        vp = acc.vp()
+        if vp < float(self.limit_on_maximum_vp):
+            return vp, None
+
+        # get the list of registered patrons
+        post = self.get_a_random_patron_post()
+        if post:
+            author, permlink = post
+            self.upvote(
+                None,
+                self.auto_curation_vote_weight,
+                author=author,
+                permlink=permlink
+            )
+
+        return vp, post
@@ -1,10 +1,12 @@
 import os
 import os.path
+import sys
 
 from dotenv import load_dotenv
 
 from .client import DcomClient
 from .embeds import get_help
+from .replay import main as replay
 from .utils import (
     parse_author_and_permlink,
     get_post_content,
@@ -17,6 +19,11 @@ import aiohttp
 
 
 def main():
+    # "dcom replay" runs the auto-curation logic on recorded data, offline.
+    if sys.argv[1:2] == ["replay"]:
+        replay(sys.argv[2:])
+        return
+
     # load environment vars from the .env file
 
     load_dotenv(dotenv_path=os.path.expanduser("~/.dcom_env"))
@@ -39,6 +46,8 @@ def main():
         "account_for_vp_check": os.getenv("ACCOUNT_FOR_VP_CHECK"),
         "limit_on_maximum_vp": os.getenv("LIMIT_ON_MAXIMUM_VP"),
         "auto_curation_vote_weight": os.getenv("AUTO_CURATION_VOTE_WEIGHT"),
+        "snapshot_path": os.path.expanduser(
+            os.getenv("SNAPSHOT_PATH", "~/.dcom_snapshot")),
     }
 
     # init the modified Discord client
@@ -178,6 +187,9 @@ def main():
     # create a timer-task for auto-curation logic
     bot.loop.create_task(bot.auto_curation())
 
+    # create a timer-task for the runtime state snapshots
+    bot.loop.create_task(bot.save_snapshots())
+
     # shoot!
     bot.run(os.getenv("DISCORD_BOT_TOKEN"))
 
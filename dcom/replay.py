@@ -0,0 +1,305 @@
+import argparse
+import bisect
+import contextlib
+import datetime
+import json
+import os
+import random
+
+from dateutil.parser import parse
+
+from .curation import CurationMixin
+
+# Voting power regenerates 20% per day on the STEEM blockchain.
+VP_REGENERATION_PER_SECOND = 20 / 86400
+
+# A full (100%) vote consumes 1/50 of the current voting power.
+VP_MAX_VOTE_DENOM = 50
+
+PARAMETERS = {
+    "limit_on_maximum_vp": float,
+    "auto_curation_vote_weight": int,
+    "auto_curation_interval": int,
+    "late_curation_window": int,
+    "early_curation_window": int,
+}
+
+
+def load_jsonl(path):
+    """
+    Reads a JSONL file and returns a list of dicts.
+    """
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def parse_parameter_set(value):
+    """
+    Parses a parameter set in the "key=value,key=value" form.
+    """
+    parameter_set = {}
+    for pair in value.split(","):
+        try:
+            key, raw_value = pair.split("=")
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Invalid parameter: {pair}")
+        if key not in PARAMETERS:
+            raise argparse.ArgumentTypeError(f"Unknown parameter: {key}")
+        parameter_set[key] = PARAMETERS[key](raw_value)
+
+    return parameter_set
+
+
+class ReplayAccount:
+
+    def __init__(self, replay, username):
+        self.replay = replay
+        self.username = username
+
+    def vp(self):
+        return self.replay.vp()
+
+    def history(self, filter=None, stop_at=None):
+        # newest first, like the account history api.
+        for op in reversed(self.replay.history()):
+            if op["timestamp"] < stop_at:
+                break
+            if filter and op.get("type", "vote") not in filter:
+                continue
+            yield op
+
+
+class ReplayLightsteemClient:
+    """
+    Serves the recorded data to the curation logic through the same
+    interface of the lightsteem client, based on the simulated clock.
+    """
+
+    def __init__(self, replay):
+        self.replay = replay
+
+    def account(self, username):
+        return ReplayAccount(self.replay, username)
+
+    def get_discussions_by_blog(self, query):
+        return self.replay.blog(query["tag"], query["limit"])
+
+
+class Replay(CurationMixin):
+    """
+    Runs the auto-curation rounds on a simulated clock with the recorded
+    account history and blog snapshots.
+
+    VP is modeled forward from the starting VP, with the replayed votes
+    and the recorded (independent) votes of the bot account.
+    """
+
+    def __init__(self, history, blogs, start_vp, patrons, bot_account,
+                 account_for_vp_check, parameters):
+        self.lightsteem_client = ReplayLightsteemClient(self)
+        self.bot_account = bot_account
+        self.account_for_vp_check = account_for_vp_check
+        self.auto_curation_vote_weight = 20
+        for key, value in parameters.items():
+            setattr(self, key, value)
+
+        self.patrons = patrons
+        self.recorded_history = sorted(history, key=lambda op: op["timestamp"])
+        self.recorded_history_times = [
+            op["timestamp"] for op in self.recorded_history]
+        self.recorded_index = 0
+        self.vp_deficit = 100 - start_vp
+        self.vp_updated_at = None
+        self.blogs = {}
+        self.blog_times = {}
+        for blog, posts in blogs.items():
+            posts = sorted(posts, key=lambda p: p["created_at"])
+            self.blogs[blog] = posts
+            self.blog_times[blog] = [p["created_at"] for p in posts]
+        self.curated_authors = {}
+        self.curated_authors_synced_at = None
+        self.now = None
+        self.votes = []
+
+    def utcnow(self):
+        return self.now
+
+    def get_verified_patrons(self):
+        return list(self.patrons)
+
+    def upvote(self, post_content, weight, author=None, permlink=None):
+        self.regenerate()
+        drain = self.drain(self.now, weight)
+        self.votes.append({
+            "timestamp": self.now,
+            "type": "vote",
+            "voter": self.bot_account,
+            "author": author,
+            "permlink": permlink,
+            "weight": weight * 100,
+            "vp_used": drain,
+        })
+
+    def history(self):
+        recorded = self.recorded_history[:bisect.bisect_right(
+            self.recorded_history_times, self.now)]
+        return sorted(recorded + self.votes, key=lambda op: op["timestamp"])
+
+    def drain(self, at, weight):
+        """
+        Regenerates the vp deficit until the given time, then applies a
+        vote with the weight (percent). Returns the vp used.
+        """
+        elapsed = (at - self.vp_updated_at).total_seconds()
+        self.vp_deficit = max(
+            0, self.vp_deficit - elapsed * VP_REGENERATION_PER_SECOND)
+        used = (100 - self.vp_deficit) * weight / 100 / VP_MAX_VOTE_DENOM
+        self.vp_deficit += used
+        self.vp_updated_at = at
+
+        return used
+
+    def regenerate(self):
+        """
+        Carries the vp deficit forward to the simulated time, applying the
+        recorded votes on the way.
+        """
+        while self.recorded_index < len(self.recorded_history) and \
+                self.recorded_history[self.recorded_index]["timestamp"] <= \
+                self.now:
+            op = self.recorded_history[self.recorded_index]
+            self.recorded_index += 1
+            if op["timestamp"] < self.vp_updated_at or \
+                    op["voter"] != self.bot_account:
+                continue
+            self.drain(op["timestamp"], abs(op.get("weight", 10000)) / 100)
+
+        self.drain(self.now, 0)
+
+    def vp(self):
+        self.regenerate()
+        return 100 - self.vp_deficit
+
+    def blog(self, account, limit):
+        posts = self.blogs.get(account, [])
+        index = bisect.bisect_right(
+            self.blog_times.get(account, []), self.now)
+        voted = set((v["author"], v["permlink"]) for v in self.votes)
+        discussions = []
+        for post in reversed(posts[max(index - limit, 0):index]):
+            post = dict(post)
+            # hide the votes casted after the simulated time
+            post["active_votes"] = [
+                v for v in post["active_votes"] if v["time_at"] <= self.now]
+            if (post["author"], post["permlink"]) in voted:
+                post["active_votes"] = post["active_votes"] + [
+                    {"voter": self.bot_account}]
+            discussions.append(post)
+
+        return discussions
+
+    def run(self, start, end):
+        rounds = 0
+        self.now = start
+        self.vp_updated_at = start
+        # silence the logging of the curation logic, it's too chatty
+        # for thousands of rounds.
+        with open(os.devnull, "w") as devnull, \
+                contextlib.redirect_stdout(devnull):
+            while self.now < end:
+                self.auto_curation_round()
+                rounds += 1
+                self.now += datetime.timedelta(
+                    seconds=self.auto_curation_interval)
+
+        return {
+            "rounds": rounds,
+            "votes": len(self.votes),
+            "vp_used": sum(v["vp_used"] for v in self.votes),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="dcom replay",
+        description="Replays the auto-curation logic on recorded data.")
+    parser.add_argument("--history", required=True,
+                        help="JSONL file of the bot account's vote ops.")
+    parser.add_argument("--blogs", required=True,
+                        help="JSONL file of the blog snapshots.")
+    parser.add_argument("--vp", required=True,
+                        help="JSONL file of the VP samples.")
+    parser.add_argument("--patrons", required=True,
+                        help="JSONL file of the verified patrons.")
+    parser.add_argument("--bot-account", required=True)
+    parser.add_argument("--account-for-vp-check")
+    parser.add_argument("--start", type=parse,
+                        help="Defaults to the first VP sample.")
+    parser.add_argument("--end", type=parse,
+                        help="Defaults to the last VP sample.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--exclude-weight", type=int,
+                        help="Drops the recorded votes with that weight "
+                             "(percent), e.g. the production auto-curation "
+                             "votes.")
+    parser.add_argument("--params", type=parse_parameter_set,
+                        action="append", dest="parameter_sets",
+                        help="A parameter set to replay. Ex: "
+                             "limit_on_maximum_vp=90,"
+                             "auto_curation_vote_weight=20")
+    args = parser.parse_args(argv)
+
+    history = load_jsonl(args.history)
+    for op in history:
+        op["timestamp"] = parse(op["timestamp"])
+    if args.exclude_weight is not None:
+        history = [op for op in history
+                   if op.get("weight") != args.exclude_weight * 100]
+
+    blogs = {}
+    for post in load_jsonl(args.blogs):
+        post["created_at"] = parse(post["created"])
+        for vote in post["active_votes"]:
+            vote["time_at"] = parse(vote["time"])
+        blogs.setdefault(post.get("blog", post["author"]), []).append(post)
+
+    vp_samples = [(parse(s["timestamp"]), float(s["vp"]))
+                  for s in load_jsonl(args.vp)]
+    if not vp_samples:
+        parser.error("At least one VP sample is required.")
+
+    patrons = [p["steem_username"] for p in load_jsonl(args.patrons)]
+
+    vp_samples.sort()
+    start = args.start or vp_samples[0][0]
+    end = args.end or vp_samples[-1][0]
+
+    # only the starting vp is taken from the samples, the rest is modeled.
+    # samples include the drain of the production auto-curation.
+    index = bisect.bisect_right([t for t, _ in vp_samples], start)
+    start_vp = vp_samples[max(index - 1, 0)][1]
+
+    parameter_sets = args.parameter_sets or []
+    if not parameter_sets:
+        parser.error("At least one parameter set is required.")
+    for parameters in parameter_sets:
+        if "limit_on_maximum_vp" not in parameters:
+            parser.error("limit_on_maximum_vp is required in parameter sets.")
+
+    for parameters in parameter_sets:
+        # same seed for each set, so the results are comparable.
+        random.seed(args.seed)
+        replay = Replay(
+            history, blogs, start_vp, patrons,
+            args.bot_account,
+            args.account_for_vp_check or args.bot_account,
+            parameters,
+        )
+        result = replay.run(start, end)
+        print(
+            f"{parameters}: {result['rounds']} rounds, "
+            f"{result['votes']} votes, "
+            f"{result['vp_used']:.2f}% vp used")
+        for vote in replay.votes:
+            print(f"  {vote['timestamp']} @{vote['author']}/"
+                  f"{vote['permlink']} %{vote['weight'] // 100}")
@@ -0,0 +1,48 @@
+import json
+import os
+import struct
+import zlib
+
+# Snapshot layout: header + zlib compressed JSON payload.
+# header: magic, format version, crc32 of the payload, payload length
+HEADER = struct.Struct("<4sHII")
+MAGIC = b"DCOM"
+VERSION = 1
+
+
+def dump(path, state):
+    """
+    Writes the state into the snapshot file atomically.
+    """
+    payload = zlib.compress(
+        json.dumps(state, separators=(",", ":")).encode())
+    header = HEADER.pack(MAGIC, VERSION, zlib.crc32(payload), len(payload))
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def load(path):
+    """
+    Reads the snapshot file and returns the state.
+    Raises ValueError if the snapshot is not valid.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if len(data) < HEADER.size:
+        raise ValueError("Snapshot is truncated.")
+
+    magic, version, checksum, length = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a dcom snapshot.")
+    if version != VERSION:
+        raise ValueError(f"Unsupported snapshot version: {version}")
+
+    payload = data[HEADER.size:HEADER.size + length]
+    if len(payload) != length or zlib.crc32(payload) != checksum:
+        raise ValueError("Snapshot checksum mismatch.")
+
+    return json.loads(zlib.decompress(payload).decode())